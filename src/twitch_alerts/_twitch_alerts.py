@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import concurrent.futures
 import dataclasses
 import json
 import logging
@@ -7,16 +8,59 @@ import os
 import sys
 import time
 import tomllib
+import types
+from collections.abc import Mapping
+from collections.abc import Sequence
 
 import requests
 
 CONFIG_FILE = "twitch-alerts.toml"
 STATE_FILE = "temp_twitch-alerts-state.json"
+AUTH_FILE = "temp_twitch-alerts-auth.json"
+AUTH_EXPIRY_MARGIN_SECONDS = 60
+HTTP_TIMEOUT = (3.0, 5.0)  # Seconds to (connect, read), warm keep-alive connects are near zero
 SCAN_FREQUENCY_SECONDS = 300  # Five minutes
+TWITCH_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+HELIX_STREAMS_URL = "https://api.twitch.tv/helix/streams"
+PAGERDUTY_EVENTS_URL = "https://events.pagerduty.com/v2/enqueue"
+HELIX_STREAMS_BATCH_SIZE = 100  # Maximum user_login values per Helix streams request
 
 logger = logging.getLogger("twitch-alerts")
 
 
+class AuthenticationError(Exception):
+    """Raised when TwitchTV rejects the bearer token before it is expected to expire."""
+
+
+def _build_session() -> requests.Session:
+    """Build a shared session so connections are kept alive between requests."""
+    session = requests.Session()
+    session.headers["User-Agent"] = "twitch-alerts"
+
+    # Retry rate limits and server errors on idempotent requests, notifications are never re-sent
+    retry = requests.adapters.Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=retry,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+_SESSION = _build_session()
+
+# Batch of channel names to the ETag and parsed result of its last Helix streams response
+_ETAG_CACHE: dict[tuple[str, ...], tuple[str, dict[str, Channel]]] = {}
+
+
 @dataclasses.dataclass(frozen=True, slots=True)
 class Config:
     twitch_client_id: str
@@ -24,56 +68,64 @@ class Config:
     twitch_channel_names: frozenset[str]
     discord_webhook_url: str
     pagerduty_key: str
+    twitch_channel_names_sorted: tuple[str, ...] = dataclasses.field(init=False, repr=False)
 
+    def __post_init__(self) -> None:
+        # Sorted once so every scan walks the channels in the same order without re-sorting
+        names_sorted = tuple(sorted(self.twitch_channel_names))
+        object.__setattr__(self, "twitch_channel_names_sorted", names_sorted)
 
-@dataclasses.dataclass(frozen=True, slots=True)
+
+@dataclasses.dataclass(frozen=True, slots=True, eq=False)
 class Auth:
     access_token: str
     expires_at: int
     client_id: str
+    headers: Mapping[str, str] = dataclasses.field(init=False, repr=False)
 
-    @property
-    def expired(self) -> bool:
-        return time.time() >= self.expires_at
-
-    @property
-    def headers(self) -> dict[str, str]:
-        return {
+    def __post_init__(self) -> None:
+        # Frozen dataclass, headers are built once here instead of on every request.
+        # Read-only view as the same mapping is shared by every request made with this token.
+        headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Client-Id": self.client_id,
         }
+        object.__setattr__(self, "headers", types.MappingProxyType(headers))
 
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
 
-@dataclasses.dataclass(frozen=True, slots=True)
+
+@dataclasses.dataclass(frozen=True, slots=True, eq=False)
 class Channel:
     name: str
     title: str
     game: str
     thumbnail_url: str
     type: str  # noqa: A003
+    url: str = dataclasses.field(init=False)
+    is_live: bool = dataclasses.field(init=False)
 
-    @property
-    def url(self) -> str:
-        return f"https://twitch.tv/{self.name}"
-
-    @property
-    def is_live(self) -> bool:
-        return self.type == "live"
+    def __post_init__(self) -> None:
+        # Frozen dataclass, derived values are set once here instead of on every read
+        object.__setattr__(self, "url", f"https://twitch.tv/{self.name}")
+        object.__setattr__(self, "is_live", self.type == "live")
 
 
-def load_config(filename: str | None = None) -> Config:
-    """Load config toml from current working directory."""
+def load_config(filename: str | None = None, env: Mapping[str, str] = os.environ) -> Config:
+    """Load config toml from current working directory, secrets are read from env."""
     with open(filename or CONFIG_FILE, "rb") as infile:
         raw_config = tomllib.load(infile)
 
-    client_secret = os.getenv("TWITCH_ALERT_CLIENT_SECRET")
-    discord_webhook = os.getenv("TWITCH_ALERT_DISCORD_WEBHOOK")
-    pagerduty_key = os.getenv("TWITCH_ALERT_PAGERDUTY_KEY")
+    client_secret = env.get("TWITCH_ALERT_CLIENT_SECRET")
+    discord_webhook = env.get("TWITCH_ALERT_DISCORD_WEBHOOK")
+    pagerduty_key = env.get("TWITCH_ALERT_PAGERDUTY_KEY")
 
     return Config(
         twitch_client_id=raw_config["twitch_client_id"],
         twitch_client_secret=client_secret or raw_config["twitch_client_secret"],
-        twitch_channel_names=frozenset(raw_config["twitch_channel_names"]),
+        twitch_channel_names=frozenset(name.lower() for name in raw_config["twitch_channel_names"]),
         discord_webhook_url=discord_webhook or "",
         pagerduty_key=pagerduty_key or "",
     )
@@ -83,14 +135,13 @@ def get_bearer_token(client_id: str, client_secret: str) -> Auth | None:
     """Get Twitch API bearer via client credential grant flow."""
     logger.info("Getting bearer token...")
 
-    url = "https://id.twitch.tv/oauth2/token"
     payload = {
         "client_id": client_id,
         "client_secret": client_secret,
         "grant_type": "client_credentials",
     }
 
-    response = requests.post(url, data=payload, timeout=3)
+    response = _SESSION.post(TWITCH_TOKEN_URL, data=payload, timeout=HTTP_TIMEOUT)
 
     if not response.ok:
         logger.critical("Failed to get bearer token: %s", response.text)
@@ -98,117 +149,226 @@ def get_bearer_token(client_id: str, client_secret: str) -> Auth | None:
 
     logger.info("Bearer token response got.")
 
-    access_token = response.json()["access_token"]
-    expires_at = int(time.time() + response.json()["expires_in"])
+    body = response.json()
+    access_token = body["access_token"]
+    expires_at = int(time.time() + body["expires_in"])
 
     return Auth(access_token, expires_at, client_id)
 
 
-def _get_channel(channel_name: str, auth: Auth) -> Channel:
-    logger.info("Fetching: %s", channel_name)
+def _load_auth(auth_file: str, client_id: str) -> Auth | None:
+    """Load cached bearer token, None if missing, unreadable, expiring, or for another client."""
+    try:
+        with open(auth_file, "r") as infile:
+            logger.debug("Loading '%s' auth file.", auth_file)
+            auth = Auth(**json.load(infile))
+
+        if not isinstance(auth.expires_at, int) or isinstance(auth.expires_at, bool):
+            raise TypeError(f"expires_at must be an int, got {auth.expires_at!r}")
+
+        if not isinstance(auth.access_token, str) or not isinstance(auth.client_id, str):
+            raise TypeError("access_token and client_id must be strings")
+
+    except FileNotFoundError:
+        logger.debug("Auth file '%s' does not exist.", auth_file)
+        return None
+
+    except (OSError, ValueError, TypeError) as err:
+        logger.warning("Ignoring unreadable auth file '%s': %s", auth_file, err)
+        return None
+
+    if auth.client_id != client_id:
+        logger.debug("Cached bearer token is for a different client id.")
+        return None
+
+    if time.time() >= auth.expires_at - AUTH_EXPIRY_MARGIN_SECONDS:
+        logger.debug("Cached bearer token is expired or about to expire.")
+        return None
+
+    return auth
+
+
+def _save_auth(auth: Auth, auth_file: str) -> None:
+    """Save bearer token to file, readable only by the current user."""
+    cached = {
+        "access_token": auth.access_token,
+        "expires_at": auth.expires_at,
+        "client_id": auth.client_id,
+    }
+
+    fd = os.open(auth_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, "w") as outfile:
+        logger.debug("Saving '%s' auth file.", auth_file)
+        json.dump(cached, outfile)
+
+
+def _get_live_channels(channel_names: Sequence[str], auth: Auth) -> dict[str, Channel]:
+    """Fetch a batch of channels in one Helix request, return map of name to live Channel."""
+    # Joining up to a full batch of names is skipped when the message would be dropped anyway
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Fetching: %s", ", ".join(channel_names))
+
+    params = [("user_login", channel_name) for channel_name in channel_names]
+    headers: Mapping[str, str] = auth.headers
 
-    url = "https://api.twitch.tv/helix/streams"
-    params = {"user_login": channel_name}
+    # Conditional request, if Helix answers 304 the previous result is still current
+    cached = _ETAG_CACHE.get(tuple(channel_names))
+    if cached is not None:
+        headers = {**auth.headers, "If-None-Match": cached[0]}
 
     try:
-        response = requests.get(url, params=params, timeout=3, headers=auth.headers)
+        response = _SESSION.get(
+            HELIX_STREAMS_URL, params=params, timeout=HTTP_TIMEOUT, headers=headers
+        )
 
     except requests.ConnectionError as err:
-        msg = f"Connection error, skipping check on {channel_name}: {err}"
+        msg = f"Connection error, skipping check on {', '.join(channel_names)}: {err}"
         logger.error("%s", msg)
         raise ValueError(msg)
 
+    if response.status_code == 401:
+        msg = f"Bearer token rejected while fetching '{', '.join(channel_names)}'"
+        logger.warning("%s", msg)
+        raise AuthenticationError(msg)
+
+    if response.status_code == 304 and cached is not None:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Streams unchanged for: %s", ", ".join(channel_names))
+        return cached[1]
+
+    if response.status_code == 400:
+        return _split_rejected_batch(channel_names, auth, response.text)
+
     if not response.ok:
-        msg = f"Failed to fetch '{channel_name}' with error: {response.text}"
+        msg = f"Failed to fetch '{', '.join(channel_names)}' with error: {response.text}"
         logger.error("%s", msg)
         raise ValueError(msg)
 
-    if not response.json()["data"]:
-        msg = f"No data for '{channel_name}', must be off-line."
-        logger.info(msg)
-        raise KeyError(msg)
-
-    channel = Channel(
-        name=response.json()["data"][0]["user_login"],
-        title=response.json()["data"][0]["title"],
-        game=response.json()["data"][0]["game_name"],
-        thumbnail_url=response.json()["data"][0]["thumbnail_url"],
-        type=response.json()["data"][0]["type"],
-    )
+    live_channels: dict[str, Channel] = {}
+
+    for row in response.json()["data"]:
+        channel = Channel(
+            name=row["user_login"],
+            title=row["title"],
+            game=row["game_name"],
+            thumbnail_url=row["thumbnail_url"],
+            type=row["type"],
+        )
 
-    logger.info("%s live check: %s", channel.name, channel.is_live)
+        logger.info("%s live check: %s", channel.name, channel.is_live)
 
-    return channel
+        if channel.is_live:
+            live_channels[channel.name] = channel
 
+    etag = response.headers.get("ETag")
+    if etag:
+        _ETAG_CACHE[tuple(channel_names)] = (etag, live_channels)
 
-def _load_state(state_file: str) -> dict[str, bool]:
-    """Load state map of channel name to is_live status."""
-    if not os.path.exists(state_file):
-        logger.debug("State file '%s' does not exist.", state_file)
+    return live_channels
+
+
+def _split_rejected_batch(
+    channel_names: Sequence[str],
+    auth: Auth,
+    error: str,
+) -> dict[str, Channel]:
+    """Split a batch Helix rejected so one invalid login does not hide the other channels."""
+    if len(channel_names) == 1:
+        logger.error("Failed to fetch '%s' with error: %s", channel_names[0], error)
         return {}
 
-    with open(state_file, "r") as infile:
-        logger.debug("Loading '%s' state file.", state_file)
-        return json.load(infile)
+    logger.warning("Batch of %d channels rejected, splitting to isolate.", len(channel_names))
+
+    middle = len(channel_names) // 2
+    first_half = _get_live_channels(channel_names[:middle], auth)
+    second_half = _get_live_channels(channel_names[middle:], auth)
+
+    return {**first_half, **second_half}
+
+
+def _load_state(state_file: str) -> frozenset[str]:
+    """Load state set of channel names that were live at the last check."""
+    try:
+        with open(state_file, "r") as infile:
+            logger.debug("Loading '%s' state file.", state_file)
+            state = json.load(infile)
+
+    except FileNotFoundError:
+        logger.debug("State file '%s' does not exist.", state_file)
+        return frozenset()
+
+    # Older state files were a map of channel name to is_live status
+    if isinstance(state, dict):
+        return frozenset(channel_name for channel_name, is_live in state.items() if is_live)
+
+    return frozenset(state)
 
 
-def _save_state(state: dict[str, bool], state_file: str) -> None:
-    """Save state map of channel name to is_live status to file."""
-    with open(state_file, "w") as outfile:
+def _save_state(state: frozenset[str], state_file: str) -> None:
+    """Save state set of currently live channel names to file."""
+    # Write to a temp file and swap it in so an interrupted write never leaves torn JSON
+    temp_file = f"{state_file}.tmp"
+
+    with open(temp_file, "w") as outfile:
         logger.debug("Saving '%s' state file.", state_file)
-        json.dump(state, outfile)
+        outfile.write(json.dumps(sorted(state)))
+
+    os.replace(temp_file, state_file)
 
 
 def _isolate_newly_active(
-    previous_state: dict[str, bool],
-    current_state: dict[str, bool],
+    previous_state: frozenset[str],
+    current_state: frozenset[str],
 ) -> frozenset[str]:
     """Isolate the channel names that have gone live since last state check."""
-    new_actives = set()
-    for channel_name, state in current_state.items():
-        channel_name = channel_name.lower()
-
-        if state and not previous_state.get(channel_name, False):
-            new_actives.add(channel_name)
-
-    return frozenset(new_actives)
+    return current_state - previous_state
 
 
 def isolate_who_went_live(
     auth: Auth,
-    state_file: str,
-    channels: list[str],
-) -> list[Channel]:
-    """Compare current state of Twitch with saved state, return newly live channel names."""
-    previous_state = _load_state(state_file)
-    current_state = {}
+    previous_state: frozenset[str],
+    channels: Sequence[str],
+) -> tuple[list[Channel], frozenset[str]]:
+    """Compare current state of Twitch with previous state, return newly live channels and state.
 
+    Channel names are expected to be lowercase, matching the user_login values from Twitch.
+    """
     live_channel_map: dict[str, Channel] = {}
 
-    for channel_name in channels:
-        channel_name = channel_name.lower()
+    batches = [
+        channels[start : start + HELIX_STREAMS_BATCH_SIZE]
+        for start in range(0, len(channels), HELIX_STREAMS_BATCH_SIZE)
+    ]
+
+    # Each batch is an independent request; run them concurrently so a scan costs one round-trip.
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = [executor.submit(_get_live_channels, batch, auth) for batch in batches]
 
+    carried_over: set[str] = set()
+
+    for batch, future in zip(batches, futures):
         try:
-            channel = _get_channel(channel_name, auth)
+            live_channels = future.result()
 
         except (ValueError, KeyError):
-            current_state[channel_name] = False
+            # Unknown is not offline, keep the last known state so recovery does not re-alert
+            carried_over.update(previous_state.intersection(batch))
             continue
 
-        current_state[channel_name] = channel.is_live
-        if channel.is_live:
-            live_channel_map[channel.name] = channel
+        live_channel_map.update(live_channels)
+
+    current_state = frozenset(live_channel_map).union(carried_over)
 
     new_actives = _isolate_newly_active(previous_state, current_state)
 
     logger.info("Discovered %d newly live channels.", len(new_actives))
 
-    _save_state(current_state, state_file)
-
-    return [
-        channel for channel_name, channel in live_channel_map.items() if channel_name in new_actives
+    new_channels = [
+        live_channel_map[channel_name] for channel_name in channels if channel_name in new_actives
     ]
 
+    return new_channels, current_state
+
 
 def send_discord_webhook(channels: list[Channel], webhook_url: str) -> None:
     """Send notification webhook to Discord."""
@@ -216,13 +376,16 @@ def send_discord_webhook(channels: list[Channel], webhook_url: str) -> None:
         logger.info("No Discord webhook given, skipping notification route.")
         return None
 
-    content_lines = []
-    for channel in channels:
-        content_lines.append(
-            f"## [{channel.name}]({channel.url})\n"
-            f"Title: {channel.title}\n"
-            f"Playing: {channel.game}\n\n"
-        )
+    if not channels:
+        logger.debug("No channels to notify, skipping notification route.")
+        return None
+
+    description = "".join(
+        f"## [{channel.name}]({channel.url})\n"
+        f"Title: {channel.title}\n"
+        f"Playing: {channel.game}\n\n"
+        for channel in channels
+    )
 
     webhook = {
         "username": "Twitch-Alerts",
@@ -232,13 +395,13 @@ def send_discord_webhook(channels: list[Channel], webhook_url: str) -> None:
                     "name": "Twitch-Alerts",
                 },
                 "title": f"<t:{int(time.time())}:R>",
-                "description": "".join(content_lines),
+                "description": description,
                 "color": 0x9C5D7F,
             },
         ],
     }
 
-    response = requests.post(webhook_url, json=webhook, timeout=3)
+    response = _SESSION.post(webhook_url, json=webhook, timeout=HTTP_TIMEOUT)
 
     if not response.ok:
         logger.error(
@@ -258,14 +421,17 @@ def send_pagerduty_alert(channels: list[Channel], integration_key: str) -> None:
         logger.info("No PagerDuty key given, skipping notification route.")
         return None
 
-    url = "https://events.pagerduty.com/v2/enqueue"
-    channel_details = {channel.name: f"{channel.url}" for channel in channels}
+    if not channels:
+        logger.debug("No channels to notify, skipping notification route.")
+        return None
+
+    channel_details = {channel.name: channel.url for channel in channels}
     names = ", ".join([channel.name for channel in channels])
 
     payload = {
         "routing_key": integration_key,
         "event_action": "trigger",
-        "dedup_key": str(time.time()),
+        "dedup_key": str(time.time_ns()),
         "payload": {
             "summary": f"Twitch.tv live: {names}",
             "source": "Twitch-Alerts",
@@ -274,7 +440,7 @@ def send_pagerduty_alert(channels: list[Channel], integration_key: str) -> None:
         },
     }
 
-    response = requests.post(url, json=payload, timeout=3)
+    response = _SESSION.post(PAGERDUTY_EVENTS_URL, json=payload, timeout=HTTP_TIMEOUT)
 
     if not response.ok:
         logger.error(
@@ -288,6 +454,32 @@ def send_pagerduty_alert(channels: list[Channel], integration_key: str) -> None:
         logger.info("PagerDuty notification sent!")
 
 
+def _authenticate(config: Config) -> Auth:
+    """Get a new bearer token and cache it, exit if TwitchTV refuses."""
+    auth = get_bearer_token(config.twitch_client_id, config.twitch_client_secret)
+    if auth is None:
+        logger.error("Error authenticating with TwitchTV.")
+        raise SystemExit()
+
+    _save_auth(auth, AUTH_FILE)
+
+    return auth
+
+
+def send_notifications(channels: list[Channel], config: Config) -> None:
+    """Send all notification routes concurrently, a failing route does not block the others."""
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = {
+            "Discord": executor.submit(send_discord_webhook, channels, config.discord_webhook_url),
+            "PagerDuty": executor.submit(send_pagerduty_alert, channels, config.pagerduty_key),
+        }
+
+    for route, future in futures.items():
+        err = future.exception()
+        if err is not None:
+            logger.error("Unexpected error sending %s notification: %s", route, err)
+
+
 def run(*, loop_flag: bool = True) -> None:
     """Run scans in a loop every SCAN_FREQUENCY_SECONDS, if loop_flag is false only run once."""
     if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
@@ -296,36 +488,44 @@ def run(*, loop_flag: bool = True) -> None:
         configfile = CONFIG_FILE
 
     config = load_config(configfile)
-    auth: Auth | None = None
-
-    next_scan_at = 0
-    new_channels: list[Channel] = []
+    auth = _load_auth(AUTH_FILE, config.twitch_client_id)
+    previous_state = _load_state(STATE_FILE)
 
     while "Party rock is in the house tonight":
+        next_scan_at = time.time() + SCAN_FREQUENCY_SECONDS
 
-        if time.time() > next_scan_at:
-            if auth is None or auth.expired:
-                auth = get_bearer_token(config.twitch_client_id, config.twitch_client_secret)
-                if auth is None:
-                    logger.error("Error authenticating with TwitchTV.")
-                    raise SystemExit()
+        if auth is None or auth.expired:
+            auth = _authenticate(config)
 
-            new_channels = isolate_who_went_live(
+        try:
+            new_channels, current_state = isolate_who_went_live(
                 auth=auth,
-                state_file=STATE_FILE,
-                channels=sorted(config.twitch_channel_names),
+                previous_state=previous_state,
+                channels=config.twitch_channel_names_sorted,
             )
 
-            next_scan_at = int(time.time()) + SCAN_FREQUENCY_SECONDS
+        except AuthenticationError:
+            # Tokens can be revoked early, refresh once and retry so no live event is missed
+            auth = _authenticate(config)
+            try:
+                new_channels, current_state = isolate_who_went_live(
+                    auth=auth,
+                    previous_state=previous_state,
+                    channels=config.twitch_channel_names_sorted,
+                )
 
-        if new_channels:
-            new_channels.sort(key=lambda channel: channel.name)
-            send_discord_webhook(new_channels, config.discord_webhook_url)
-            send_pagerduty_alert(new_channels, config.pagerduty_key)
+            except AuthenticationError:
+                logger.error("Bearer token rejected again after re-authenticating with TwitchTV.")
+                raise SystemExit()
+
+        if current_state != previous_state:
+            _save_state(current_state, STATE_FILE)
+            previous_state = current_state
 
-            new_channels.clear()
+        if new_channels:
+            send_notifications(new_channels, config)
 
         if not loop_flag:
             break
 
-        time.sleep(0.1)
+        time.sleep(max(0, next_scan_at - time.time()))
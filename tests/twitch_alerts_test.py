@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import functools
+import json
 import os
-import tempfile
+import pathlib
 import time
+from collections.abc import Callable
 from typing import Any
-from unittest.mock import patch
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
 
 import pytest
 import requests
@@ -13,58 +17,107 @@ from responses import matchers
 
 from twitch_alerts import _twitch_alerts
 
-
-def make_twitch_streams_json(user_login: str, *, is_live: bool = True) -> dict[str, Any]:
-    if user_login == "invalid":
-        return {"error": "Bad Request", "status": 400, "message": "Malformed query params."}
-
-    if not is_live:
-        return {"data": [], "pagination": {}}
-
-    return {
-        "data": [
-            {
-                "id": "8675309",
-                "user_id": "8675309",
-                "user_login": user_login,
-                "user_name": user_login,
-                "game_id": "24241",
-                "game_name": "FINALFANTASY XIV ONLINE",
-                "type": "live",
-                "title": f"Some Cool Title for {user_login}",
-                "viewer_count": 69,
-                "started_at": "2025-08-22T03:59:06Z",
-                "language": "other",
-                "thumbnail_url": f"https://static-cdn.jtvnw.net/previews-ttv/live_user_{user_login}-{{width}}x{{height}}.jpg",
-                "tag_ids": [],
-                "tags": [],
-                "is_mature": True,
-            }
-        ],
-        "pagination": {
-            "cursor": "eyJiIjp7IkN1cnNvciI6ImV5SnpJam94TnpVMU9ETTFNVFEyTGpJM09ETTBPVFlzSW1RaU9tWmhiSE5sTENKMElqcDBjblZsZlE9PSJ9LCJhIjp7IkN1cnNvciI6IiJ9fQ"
-        },
-    }
+_TITLE_FMT = "Some Cool Title for %s"
+_THUMB_FMT = "https://static-cdn.jtvnw.net/previews-ttv/live_user_%s-{width}x{height}.jpg"
+_ERROR_BODY = {"error": "Bad Request", "status": 400, "message": "Malformed query params."}
+_TOKEN_BODY = json.dumps(
+    {"access_token": "mockToken", "expires_in": 5222281, "token_type": "bearer"}
+).encode()
+_TEMPLATE_ENTRY = {
+    "id": "8675309",
+    "user_id": "8675309",
+    "user_login": "",
+    "user_name": "",
+    "game_id": "24241",
+    "game_name": "FINALFANTASY XIV ONLINE",
+    "type": "live",
+    "title": "",
+    "viewer_count": 69,
+    "started_at": "2025-08-22T03:59:06Z",
+    "language": "other",
+    "thumbnail_url": "",
+    "tag_ids": [],
+    "tags": [],
+    "is_mature": True,
+}
+
+
+def make_twitch_stream_entry(user_login: str) -> dict[str, Any]:
+    entry = _TEMPLATE_ENTRY.copy()
+    entry["user_login"] = entry["user_name"] = user_login
+    entry["title"] = _TITLE_FMT % user_login
+    entry["thumbnail_url"] = _THUMB_FMT % user_login
+    return entry
+
+
+def make_twitch_streams_batch_json(user_logins: list[str]) -> dict[str, Any]:
+    data = [make_twitch_stream_entry(user_login) for user_login in user_logins]
+    return {"data": data, "pagination": {}}
+
+
+@functools.lru_cache(maxsize=8)
+def make_auth_matcher(token: str, client_id: str) -> Callable[..., Any]:
+    return matchers.header_matcher({"Authorization": f"Bearer {token}", "Client-Id": client_id})
 
 
 def make_channel(user_login: str) -> _twitch_alerts.Channel:
     return _twitch_alerts.Channel(
         name=user_login,
-        title=f"Some Cool Title for {user_login}",
+        title=_TITLE_FMT % user_login,
         game="FINALFANTASY XIV ONLINE",
-        thumbnail_url=f"https://static-cdn.jtvnw.net/previews-ttv/live_user_{user_login}-{{width}}x{{height}}.jpg",
+        thumbnail_url=_THUMB_FMT % user_login,
         type="live",
     )
 
 
+@pytest.fixture(scope="session")
+def mock_auth() -> _twitch_alerts.Auth:
+    return _twitch_alerts.Auth("mockToken", int(time.time() + 3600), "mockClientId")
+
+
+def test_channel_derived_fields() -> None:
+    channel = make_channel("channel_one")
+
+    assert channel.url == "https://twitch.tv/channel_one"
+    assert channel.is_live
+
+
 def test_load_config() -> None:
-    with patch.dict(os.environ, {}, clear=True):
-        config = _twitch_alerts.load_config()
-        assert config.twitch_client_id == "Twitch Client ID here"
-        assert config.twitch_client_secret == "PUT THIS IN THE .env FILE"
-        assert config.twitch_channel_names == {"all", "the", "streamers"}
-        assert config.discord_webhook_url == ""
-        assert config.pagerduty_key == ""
+    config = _twitch_alerts.load_config(env={})
+
+    assert config.twitch_client_id == "Twitch Client ID here"
+    assert config.twitch_client_secret == "PUT THIS IN THE .env FILE"
+    assert config.twitch_channel_names == {"all", "the", "streamers"}
+    assert config.twitch_channel_names_sorted == ("all", "streamers", "the")
+    assert config.discord_webhook_url == ""
+    assert config.pagerduty_key == ""
+
+
+def test_load_config_reads_secrets_from_env() -> None:
+    env = {
+        "TWITCH_ALERT_CLIENT_SECRET": "mockSecret",
+        "TWITCH_ALERT_DISCORD_WEBHOOK": "mockUrl",
+        "TWITCH_ALERT_PAGERDUTY_KEY": "mockKey",
+    }
+
+    config = _twitch_alerts.load_config(env=env)
+
+    assert config.twitch_client_secret == "mockSecret"
+    assert config.discord_webhook_url == "mockUrl"
+    assert config.pagerduty_key == "mockKey"
+
+
+def test_load_config_normalizes_channel_names(tmp_path: pathlib.Path) -> None:
+    config_file = tmp_path / "config.toml"
+    config_file.write_text(
+        'twitch_client_id="mockId"\n'
+        'twitch_client_secret="mockSecret"\n'
+        'twitch_channel_names=["Egg", "egg", "Bacon"]\n'
+    )
+
+    config = _twitch_alerts.load_config(str(config_file), env={})
+
+    assert config.twitch_channel_names_sorted == ("bacon", "egg")
 
 
 @responses.activate(assert_all_requests_are_fired=True)
@@ -73,7 +126,8 @@ def test_get_bearer_token() -> None:
         method="POST",
         url="https://id.twitch.tv/oauth2/token",
         status=200,
-        json={"access_token": "mockToken", "expires_in": 5222281, "token_type": "bearer"},
+        body=_TOKEN_BODY,
+        content_type="application/json",
     )
 
     auth = _twitch_alerts.get_bearer_token("mockId", "mockSecret")
@@ -83,6 +137,9 @@ def test_get_bearer_token() -> None:
     assert auth.access_token == "mockToken"
     assert auth.headers == {"Authorization": "Bearer mockToken", "Client-Id": "mockId"}
 
+    with pytest.raises(TypeError):
+        auth.headers["Client-Id"] = "otherId"  # type: ignore[index]
+
 
 @responses.activate(assert_all_requests_are_fired=True)
 def test_get_bearer_token_failure() -> None:
@@ -98,8 +155,70 @@ def test_get_bearer_token_failure() -> None:
     assert bearer is None
 
 
+def test_save_and_load_auth(tmp_path: pathlib.Path) -> None:
+    auth_file = str(tmp_path / "auth.json")
+    auth = _twitch_alerts.Auth("mockToken", int(time.time() + 600), "mockClientId")
+
+    _twitch_alerts._save_auth(auth, auth_file)
+    loaded = _twitch_alerts._load_auth(auth_file, "mockClientId")
+
+    assert loaded
+    assert loaded.access_token == auth.access_token
+    assert loaded.expires_at == auth.expires_at
+    assert loaded.client_id == auth.client_id
+    assert os.stat(auth_file).st_mode & 0o777 == 0o600
+
+
+def test_load_auth_missing_file(tmp_path: pathlib.Path) -> None:
+    auth_file = str(tmp_path / "auth.json")
+
+    assert _twitch_alerts._load_auth(auth_file, "mockClientId") is None
+
+
+@pytest.mark.parametrize(
+    "contents",
+    (
+        '{"access_token": "mockToken"}',
+        '{"access_token": "mockToken", "expires_at": "soon", "client_id": "mockClientId"}',
+        '{"access_token": null, "expires_at": 9999999999, "client_id": "mockClientId"}',
+    ),
+)
+def test_load_auth_unreadable_file(tmp_path: pathlib.Path, contents: str) -> None:
+    auth_file = tmp_path / "auth.json"
+    auth_file.write_text(contents)
+
+    assert _twitch_alerts._load_auth(str(auth_file), "mockClientId") is None
+
+
+def test_load_auth_unopenable_file(tmp_path: pathlib.Path) -> None:
+    auth_file = tmp_path / "auth.json"
+    auth_file.mkdir()
+
+    assert _twitch_alerts._load_auth(str(auth_file), "mockClientId") is None
+
+
+@pytest.mark.parametrize(
+    ("expires_in", "client_id"),
+    (
+        (30, "mockClientId"),
+        (600, "otherClientId"),
+    ),
+)
+def test_load_auth_rejects_stale_token(
+    tmp_path: pathlib.Path,
+    expires_in: int,
+    client_id: str,
+) -> None:
+    auth_file = str(tmp_path / "auth.json")
+    auth = _twitch_alerts.Auth("mockToken", int(time.time() + expires_in), "mockClientId")
+
+    _twitch_alerts._save_auth(auth, auth_file)
+
+    assert _twitch_alerts._load_auth(auth_file, client_id) is None
+
+
 @responses.activate(assert_all_requests_are_fired=True)
-def test_isolate_who_went_live_with_state() -> None:
+def test_isolate_who_went_live_with_state(mock_auth: _twitch_alerts.Auth) -> None:
     """
     - Start with no state
     - Assert new stream is captured
@@ -107,61 +226,203 @@ def test_isolate_who_went_live_with_state() -> None:
     - Assert new stream, previously false, is captured
     - Assert previously true streams are not captured
     """
-    mock_token = "mockToken"
-    mock_client_id = "mockClientId"
-    mock_auth = _twitch_alerts.Auth(mock_token, int(time.time() + 600), mock_client_id)
     channels = ["channel_one", "invalid", "channel_three", "channel_four"]
     expected_no_state = {"channel_one", "channel_three"}
     expected_with_state = {"channel_four"}
 
-    stream_matrix = [
+    phases = [
         # checked without a cache. Lives are expected to be captured
-        ("channel_one", True),
-        ("invalid", False),
-        ("channel_three", True),
-        ("channel_four", False),
+        {
+            "channel_one": True,
+            "invalid": False,
+            "channel_three": True,
+            "channel_four": False,
+        },
         # checked with cache. Only channel_four is expected to be captured
-        ("channel_one", True),
-        ("invalid", False),
-        ("channel_three", True),
-        ("channel_four", True),
-    ]
-    matcher = matchers.header_matcher(
         {
-            "Authorization": f"Bearer {mock_token}",
-            "Client-Id": mock_client_id,
-        }
+            "channel_one": True,
+            "invalid": False,
+            "channel_three": True,
+            "channel_four": True,
+        },
+    ]
+    is_live = phases[0]
+    matcher = make_auth_matcher(mock_auth.access_token, mock_auth.client_id)
+
+    def streams_callback(request: requests.PreparedRequest) -> tuple[int, dict[str, str], str]:
+        user_logins = parse_qs(urlparse(str(request.url)).query)["user_login"]
+        # Helix rejects the whole request when any login in it is malformed
+        if "invalid" in user_logins:
+            return 400, {}, json.dumps(_ERROR_BODY)
+
+        body = make_twitch_streams_batch_json([login for login in user_logins if is_live[login]])
+        return 200, {}, json.dumps(body)
+
+    responses.add_callback(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        callback=streams_callback,
+        content_type="application/json",
+        match=[matcher],
     )
 
-    for user_login, is_live in stream_matrix:
+    results_no_state, state = _twitch_alerts.isolate_who_went_live(mock_auth, frozenset(), channels)
+    is_live = phases[1]
+    results_with_state, _ = _twitch_alerts.isolate_who_went_live(mock_auth, state, channels)
+
+    assert {channel.name for channel in results_no_state} == expected_no_state
+    assert {channel.name for channel in results_with_state} == expected_with_state
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_isolate_who_went_live_batches_requests(mock_auth: _twitch_alerts.Auth) -> None:
+    channels = [f"channel_{idx:03}" for idx in range(150)]
+
+    for batch in (channels[:100], channels[100:]):
         responses.add(
             method="GET",
-            url=f"https://api.twitch.tv/helix/streams?user_login={user_login}",
-            status=200 if user_login != "invalid" else 400,
-            json=make_twitch_streams_json(user_login, is_live=is_live),
-            match=[matcher],
+            url="https://api.twitch.tv/helix/streams",
+            status=200,
+            json=make_twitch_streams_batch_json(batch[:1]),
+            match=[matchers.query_param_matcher({"user_login": batch})],
         )
 
-    fd, filename = tempfile.mkstemp()
-    os.close(fd)
-    os.remove(filename)
+    results, _ = _twitch_alerts.isolate_who_went_live(mock_auth, frozenset(), channels)
+
+    assert [channel.name for channel in results] == ["channel_000", "channel_100"]
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_isolate_who_went_live_failed_batch_keeps_state(mock_auth: _twitch_alerts.Auth) -> None:
+    channels = ["channel_one", "channel_two"]
+    previous_state = frozenset({"channel_one"})
+
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        body=requests.ConnectionError("Mock Connection Failure"),
+    )
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=200,
+        json=make_twitch_streams_batch_json(["channel_one", "channel_two"]),
+    )
+
+    failed_results, state = _twitch_alerts.isolate_who_went_live(
+        mock_auth, previous_state, channels
+    )
+    recovered_results, _ = _twitch_alerts.isolate_who_went_live(mock_auth, state, channels)
+
+    assert failed_results == []
+    assert state == previous_state
+    assert [channel.name for channel in recovered_results] == ["channel_two"]
 
-    try:
-        results_no_state = _twitch_alerts.isolate_who_went_live(mock_auth, filename, channels)
-        results_with_state = _twitch_alerts.isolate_who_went_live(mock_auth, filename, channels)
 
-        assert {channel.name for channel in results_no_state} == expected_no_state
-        assert {channel.name for channel in results_with_state} == expected_with_state
+@pytest.mark.parametrize(("status", "expected_calls"), ((403, 1), (429, 3)))
+@responses.activate(assert_all_requests_are_fired=True)
+def test_isolate_who_went_live_refused_batch_is_not_split(
+    mock_auth: _twitch_alerts.Auth,
+    status: int,
+    expected_calls: int,
+) -> None:
+    channels = [f"c{idx:03}" for idx in range(100)]
+    previous_state = frozenset({"c000", "c050"})
+
+    responses.add(method="GET", url="https://api.twitch.tv/helix/streams", status=status)
 
-    finally:
+    results, state = _twitch_alerts.isolate_who_went_live(mock_auth, previous_state, channels)
 
-        os.remove(filename)
+    assert results == []
+    assert state == previous_state
+    assert len(responses.calls) == expected_calls
 
 
 @responses.activate(assert_all_requests_are_fired=True)
-def test_send_discord_webhook_success_path(
+def test_isolate_who_went_live_malformed_body_keeps_state(mock_auth: _twitch_alerts.Auth) -> None:
+    previous_state = frozenset({"channel_one"})
+
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=200,
+        json={"pagination": {}},
+    )
+
+    results, state = _twitch_alerts.isolate_who_went_live(
+        mock_auth, previous_state, ["channel_one", "channel_two"]
+    )
+
+    assert results == []
+    assert state == previous_state
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_get_live_channels_retries_server_error(mock_auth: _twitch_alerts.Auth) -> None:
+
+    responses.add(method="GET", url="https://api.twitch.tv/helix/streams", status=503)
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=200,
+        json=make_twitch_streams_batch_json(["channel_one"]),
+    )
+
+    live_channels = _twitch_alerts._get_live_channels(["channel_one"], mock_auth)
+
+    assert list(live_channels) == ["channel_one"]
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_isolate_who_went_live_rejected_token_raises(mock_auth: _twitch_alerts.Auth) -> None:
+
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=401,
+        json={"error": "Unauthorized", "status": 401, "message": "Invalid OAuth token"},
+    )
+
+    with pytest.raises(_twitch_alerts.AuthenticationError):
+        _twitch_alerts.isolate_who_went_live(mock_auth, frozenset(), ["channel_one"])
+
+
+def test_save_state_replaces_file(tmp_path: pathlib.Path) -> None:
+    state_file = tmp_path / "state.json"
+    state_file.write_text('["channel_one"]')
+
+    _twitch_alerts._save_state(frozenset({"channel_two", "channel_three"}), str(state_file))
+
+    assert state_file.read_text() == '["channel_three", "channel_two"]'
+    assert list(tmp_path.iterdir()) == [state_file]
+
+
+def test_load_state_missing_file(tmp_path: pathlib.Path) -> None:
+    state_file = str(tmp_path / "state.json")
+
+    assert _twitch_alerts._load_state(state_file) == frozenset()
+
+
+def test_load_state_legacy_format(tmp_path: pathlib.Path) -> None:
+    state_file = tmp_path / "state.json"
+    state_file.write_text('{"channel_one": true, "channel_two": false}')
+
+    assert _twitch_alerts._load_state(str(state_file)) == {"channel_one"}
+
+
+@pytest.mark.parametrize(
+    ("status", "expected"),
+    (
+        (200, "Discord notification sent!"),
+        (404, "Failed to send discord notification: 404"),
+    ),
+)
+@responses.activate(assert_all_requests_are_fired=True)
+def test_send_discord_webhook(
     monkeypatch: pytest.MonkeyPatch,
     caplog: pytest.LogCaptureFixture,
+    status: int,
+    expected: str,
 ) -> None:
     monkeypatch.setattr(time, "time", lambda: 123456.0)
     mock_url = "https://totally.real.discord.webhook.site/124/358"
@@ -186,35 +447,23 @@ def test_send_discord_webhook_success_path(
     }
     matcher = matchers.json_params_matcher(required_payload)
 
-    responses.add(method="POST", url=mock_url, status=200, match=[matcher])
-
-    with caplog.at_level("INFO"):
-        _twitch_alerts.send_discord_webhook(channels, mock_url)
-
-    assert "Discord notification sent!" in caplog.text
-
-
-@responses.activate(assert_all_requests_are_fired=True)
-def test_send_discord_webhook_failure_path(caplog: pytest.LogCaptureFixture) -> None:
-    mock_url = "https://totally.real.discord.webhook.site/124/358"
-    channels = [make_channel("channel_one"), make_channel("channel_two")]
-
-    responses.add(method="POST", url=mock_url, status=404)
+    responses.add(method="POST", url=mock_url, status=status, match=[matcher])
 
     with caplog.at_level("INFO"):
         _twitch_alerts.send_discord_webhook(channels, mock_url)
 
-    assert "Failed to send discord notification: 404" in caplog.text
+    assert caplog.records[-1].getMessage().startswith(expected)
 
 
 def test_send_discord_webhook_no_webhook(caplog: pytest.LogCaptureFixture) -> None:
     mock_url = ""
     channels = [make_channel("channel_one"), make_channel("channel_two")]
+    expected = "No Discord webhook given, skipping notification route."
 
     with caplog.at_level("INFO"):
         _twitch_alerts.send_discord_webhook(channels, mock_url)
 
-    assert "No Discord webhook given, skipping notification route." in caplog.text
+    assert caplog.records[-1].getMessage() == expected
 
 
 @responses.activate(assert_all_requests_are_fired=True)
@@ -269,22 +518,180 @@ def test_send_pagerduty_alert_no_integration_key(caplog: pytest.LogCaptureFixtur
     assert "No PagerDuty key given, skipping notification route." in caplog.text
 
 
-def test_get_channel_connection_error(
+@responses.activate(assert_all_requests_are_fired=True)
+def test_get_live_channels_reuses_result_on_not_modified(
+    monkeypatch: pytest.MonkeyPatch,
+    mock_auth: _twitch_alerts.Auth,
+) -> None:
+    monkeypatch.setattr(_twitch_alerts, "_ETAG_CACHE", {})
+    channels = ["channel_one", "channel_two"]
+
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=200,
+        json=make_twitch_streams_batch_json(["channel_one"]),
+        headers={"ETag": '"mockEtag"'},
+    )
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=304,
+        match=[matchers.header_matcher({"If-None-Match": '"mockEtag"'})],
+    )
+
+    first = _twitch_alerts._get_live_channels(channels, mock_auth)
+    second = _twitch_alerts._get_live_channels(channels, mock_auth)
+
+    assert list(first) == ["channel_one"]
+    assert second is first
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_send_routes_skip_empty_channels() -> None:
+    # No responses are registered, any request made would raise ConnectionError
+    _twitch_alerts.send_discord_webhook([], "https://totally.real.discord.webhook.site/124/358")
+    _twitch_alerts.send_pagerduty_alert([], "pd123")
+
+
+def test_send_notifications_isolates_route_failures(
     caplog: pytest.LogCaptureFixture,
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
-    """Test that a ConnectionError is handled the same as no data for a channel."""
+    config = _twitch_alerts.Config("mockId", "mockSecret", frozenset(), "mockUrl", "mockKey")
+    channels = [make_channel("channel_one")]
+    pagerduty_calls = []
 
-    def mock_get(url: str, params: dict[str, Any], timeout: int, headers: dict[str, str]) -> None:
+    def mock_discord(channels: list[_twitch_alerts.Channel], webhook_url: str) -> None:
+        raise requests.ConnectionError("Mock Connection Failure")
+
+    def mock_pagerduty(channels: list[_twitch_alerts.Channel], integration_key: str) -> None:
+        pagerduty_calls.append((channels, integration_key))
+
+    monkeypatch.setattr(_twitch_alerts, "send_discord_webhook", mock_discord)
+    monkeypatch.setattr(_twitch_alerts, "send_pagerduty_alert", mock_pagerduty)
+
+    with caplog.at_level("ERROR"):
+        _twitch_alerts.send_notifications(channels, config)
+
+    assert pagerduty_calls == [(channels, "mockKey")]
+    assert "Unexpected error sending Discord notification: Mock Connection" in caplog.text
+
+
+@pytest.fixture
+def run_files(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    monkeypatch.setattr(_twitch_alerts.sys, "argv", ["twitch-alerts-scan-once"])
+    monkeypatch.setattr(_twitch_alerts, "STATE_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(_twitch_alerts, "AUTH_FILE", str(tmp_path / "auth.json"))
+    monkeypatch.setattr(_twitch_alerts, "_ETAG_CACHE", {})
+    monkeypatch.delenv("TWITCH_ALERT_DISCORD_WEBHOOK", raising=False)
+    monkeypatch.delenv("TWITCH_ALERT_PAGERDUTY_KEY", raising=False)
+    return tmp_path
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_run_once(run_files: pathlib.Path) -> None:
+    responses.add(
+        method="POST",
+        url="https://id.twitch.tv/oauth2/token",
+        status=200,
+        body=_TOKEN_BODY,
+        content_type="application/json",
+    )
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=200,
+        json=make_twitch_streams_batch_json(["the"]),
+    )
+
+    _twitch_alerts.run(loop_flag=False)
+
+    assert (run_files / "state.json").read_text() == '["the"]'
+    assert (run_files / "auth.json").exists()
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_run_once_reauthenticates_rejected_token(run_files: pathlib.Path) -> None:
+    stale_auth = _twitch_alerts.Auth("staleToken", int(time.time() + 600), "Twitch Client ID here")
+    _twitch_alerts._save_auth(stale_auth, str(run_files / "auth.json"))
+
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=401,
+        match=[matchers.header_matcher({"Authorization": "Bearer staleToken"})],
+    )
+    responses.add(
+        method="POST",
+        url="https://id.twitch.tv/oauth2/token",
+        status=200,
+        body=_TOKEN_BODY,
+        content_type="application/json",
+    )
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=200,
+        json=make_twitch_streams_batch_json(["the"]),
+        match=[matchers.header_matcher({"Authorization": "Bearer mockToken"})],
+    )
+
+    _twitch_alerts.run(loop_flag=False)
+
+    assert (run_files / "state.json").read_text() == '["the"]'
+
+
+@responses.activate(assert_all_requests_are_fired=True)
+def test_run_once_exits_when_fresh_token_rejected(run_files: pathlib.Path) -> None:
+    stale_auth = _twitch_alerts.Auth("staleToken", int(time.time() + 600), "Twitch Client ID here")
+    _twitch_alerts._save_auth(stale_auth, str(run_files / "auth.json"))
+
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=401,
+        match=[matchers.header_matcher({"Authorization": "Bearer staleToken"})],
+    )
+    responses.add(
+        method="POST",
+        url="https://id.twitch.tv/oauth2/token",
+        status=200,
+        body=_TOKEN_BODY,
+        content_type="application/json",
+    )
+    responses.add(
+        method="GET",
+        url="https://api.twitch.tv/helix/streams",
+        status=401,
+        match=[matchers.header_matcher({"Authorization": "Bearer mockToken"})],
+    )
+
+    with pytest.raises(SystemExit):
+        _twitch_alerts.run(loop_flag=False)
+
+    assert not (run_files / "state.json").exists()
+
+
+def test_get_live_channels_connection_error(
+    caplog: pytest.LogCaptureFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    mock_auth: _twitch_alerts.Auth,
+) -> None:
+    """Test that a ConnectionError raises ValueError so the caller keeps the previous state."""
+
+    def mock_get(
+        url: str,
+        params: list[tuple[str, str]],
+        timeout: tuple[float, float],
+        headers: dict[str, str],
+    ) -> None:
         raise requests.ConnectionError("Mock Connection Failure")
 
-    monkeypatch.setattr(_twitch_alerts.requests, "get", mock_get)
+    monkeypatch.setattr(_twitch_alerts._SESSION, "get", mock_get)
 
-    mock_token = "mockToken"
-    mock_client_id = "mockClientId"
-    mock_channel = "Egg"
-    mock_auth = _twitch_alerts.Auth(mock_token, int(time.time() + 600), mock_client_id)
-    match = "Connection error, skipping check on Egg: Mock Connection Failure"
+    mock_channels = ["Egg", "Bacon"]
+    match = "Connection error, skipping check on Egg, Bacon: Mock Connection Failure"
 
     with pytest.raises(ValueError, match=match):
-        _twitch_alerts._get_channel(mock_channel, mock_auth)
+        _twitch_alerts._get_live_channels(mock_channels, mock_auth)